@@ -1,7 +1,113 @@
+from datetime import date
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from .models import Book, Category, LibraryUser, Transaction
 
 
+# Below this many rows an exact COUNT(*) is cheap enough to keep.
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+def estimated_row_count(model, using='default'):
+    """Return the planner's row estimate for a model's table, or None"""
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [model._meta.db_table]
+            )
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s",
+                [model._meta.db_table]
+            )
+        elif connection.vendor == 'sqlite':
+            # MAX(rowid) is a single b-tree seek; it overestimates after deletes.
+            cursor.execute(f"SELECT MAX(rowid) FROM {table}")
+        else:
+            return None
+        row = cursor.fetchone()
+
+    if not row or row[0] is None or row[0] <= 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that uses a table-size estimate for unfiltered querysets"""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, using=queryset.db)
+            if estimate is not None and estimate >= ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class ScalableChangeList(ChangeList):
+    """Changelist that only loads the columns the row display needs"""
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        only_fields = self.model_admin.changelist_only_fields
+        if only_fields:
+            queryset = queryset.only(*only_fields)
+        return queryset
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    """Base admin for tables that can grow to millions of rows"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/library_api/scalable_change_list.html'
+    changelist_only_fields = ()
+
+    def get_changelist(self, request, **kwargs):
+        return ScalableChangeList
+
+
+class DecadeListFilter(admin.SimpleListFilter):
+    """Fixed decade choices, so the changelist never runs SELECT DISTINCT year"""
+    title = 'decade'
+    parameter_name = 'decade'
+
+    def lookups(self, request, model_admin):
+        current = date.today().year // 10 * 10
+        choices = [(str(decade), f'{decade}s') for decade in range(current, 1970, -10)]
+        return choices + [('older', 'Before 1980')]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value == 'older':
+            return queryset.filter(year__lt=1980)
+        if value and value.isdigit():
+            return queryset.filter(year__gte=int(value), year__lt=int(value) + 10)
+        return queryset
+
+
+class RatingListFilter(admin.SimpleListFilter):
+    """Fixed rating bands, so the changelist never runs SELECT DISTINCT rating"""
+    title = 'rating'
+    parameter_name = 'min_rating'
+
+    def lookups(self, request, model_admin):
+        return [('4', '4 and above'), ('3', '3 and above'), ('2', '2 and above')]
+
+    def queryset(self, request, queryset):
+        if self.value() in ('2', '3', '4'):
+            return queryset.filter(rating__gte=int(self.value()))
+        return queryset
+
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'code', 'description', 'created_at']
@@ -10,24 +116,43 @@ class CategoryAdmin(admin.ModelAdmin):
 
 
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(ScalableModelAdmin):
     list_display = ['title', 'author', 'category', 'year', 'copies', 'available', 'rating']
-    search_fields = ['title', 'author', 'isbn']
-    list_filter = ['category', 'year', 'rating']
+    search_fields = ['^title', '^author', '=isbn']
+    list_filter = ['category', DecadeListFilter, RatingListFilter]
     list_editable = ['copies', 'available']
+    list_select_related = ['category']
+    autocomplete_fields = ['category']
+    changelist_only_fields = [
+        'id', 'title', 'author', 'year', 'copies', 'available', 'rating',
+        'category__id', 'category__name'
+    ]
 
 
 @admin.register(LibraryUser)
-class LibraryUserAdmin(admin.ModelAdmin):
-    list_display = ['name', 'email', 'role', 'department', 'fines', 'is_active']
-    search_fields = ['name', 'email', 'student_id', 'employee_id']
+class LibraryUserAdmin(ScalableModelAdmin):
+    list_display = [
+        'name', 'email', 'role', 'department', 'fines', 'active_loans', 'overdue_loans', 'is_active'
+    ]
+    search_fields = ['^name', '=email', '=student_id', '=employee_id']
     list_filter = ['role', 'department', 'is_active']
     list_editable = ['fines', 'is_active']
+    readonly_fields = ['active_loans', 'overdue_loans', 'last_activity']
+    changelist_only_fields = [
+        'id', 'name', 'email', 'role', 'department', 'fines', 'active_loans', 'overdue_loans',
+        'is_active'
+    ]
 
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(ScalableModelAdmin):
     list_display = ['user', 'book', 'type', 'borrow_date', 'due_date', 'status', 'fine_amount']
-    search_fields = ['user__name', 'book__title']
+    search_fields = ['^user__name', '=user__email', '^book__title', '=book__isbn']
     list_filter = ['type', 'status', 'borrow_date']
-    date_hierarchy = 'borrow_date'
\ No newline at end of file
+    list_select_related = ['user', 'book']
+    autocomplete_fields = ['user', 'book']
+    date_hierarchy = 'borrow_date'
+    changelist_only_fields = [
+        'id', 'type', 'borrow_date', 'due_date', 'status', 'fine_amount', 'created_at',
+        'user__id', 'user__name', 'user__role', 'book__id', 'book__title', 'book__author'
+    ]
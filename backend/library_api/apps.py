@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class LibraryApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'library_api'
\ No newline at end of file
+    name = 'library_api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery
+from library_api.models import LibraryUser, Transaction
+
+
+class Command(BaseCommand):
+    help = 'Recompute active_loans, overdue_loans and last_activity for every user from transactions'
+
+    def handle(self, *args, **options):
+        last_activity = (
+            Transaction.objects.filter(user=OuterRef('pk'))
+            .order_by()
+            .values('user')
+            .annotate(latest=Max('updated_at'))
+            .values('latest')
+        )
+
+        with transaction.atomic():
+            count = LibraryUser.refresh_loan_counts()
+            LibraryUser.objects.update(last_activity=Subquery(last_activity))
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt loan summaries for {count} users'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from library_api.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the normalized Tag/BookTag index from each book\'s tags list'
+
+    def handle(self, *args, **options):
+        count = 0
+        for book in Book.objects.only('id', 'tags').iterator(chunk_size=2000):
+            book.sync_tags()
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Synced tags for {count} books'))
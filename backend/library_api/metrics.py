@@ -0,0 +1,270 @@
+"""
+Prometheus-style instrumentation without external dependencies.
+
+Each worker process keeps its counters and histograms in memory and
+periodically writes a snapshot to its own file in LIBRARY_METRICS_DIR.
+The /metrics view merges every process's snapshot, so no lock or
+shared state is ever contended across workers.
+
+Snapshot files are named <parent pid>-<pid>-<random>. When a process first
+flushes, it folds in the files of dead workers from the same server run, so
+totals survive worker recycling. It deletes files left by earlier runs.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Sum
+from django.http import HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FLUSH_INTERVAL = 1.0
+
+HELP = {
+    'library_request_duration_seconds': ('histogram', 'Request latency by viewset action'),
+    'library_request_errors_total': ('counter', 'Responses with status >= 400 by viewset action'),
+    'library_db_queries_total': ('counter', 'Database queries issued by viewset action'),
+    'library_db_query_seconds_total': ('counter', 'Time spent in database queries by viewset action'),
+    'library_cache_requests_total': ('counter', 'Cache lookups by cache and result'),
+    'library_borrows_total': ('counter', 'Books borrowed'),
+    'library_returns_total': ('counter', 'Books returned'),
+    'library_fines_assessed_total': ('counter', 'Fines assessed on return, in rupees'),
+    'library_fines_outstanding': ('gauge', 'Unpaid fines across all users, in rupees'),
+}
+
+
+class MetricsRegistry:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._last_flush = 0.0
+        self._pid = None
+        self._path = None
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        bucket = bisect_left(LATENCY_BUCKETS, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0]
+            histogram[0][bucket] += 1
+            histogram[1] += value
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Atomically replace this process's snapshot file"""
+        if self._pid != os.getpid():
+            self._claim_directory()
+
+        with self._lock:
+            self._last_flush = time.monotonic()
+            snapshot = {
+                'counters': [[name, labels, value] for (name, labels), value in self._counters.items()],
+                'histograms': [
+                    [name, labels, list(counts), total]
+                    for (name, labels), (counts, total) in self._histograms.items()
+                ],
+            }
+
+        tmp_path = self._path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(snapshot))
+        os.replace(tmp_path, self._path)
+
+    def _claim_directory(self):
+        """Pick this process's file name and tidy up files of dead processes"""
+        pid, run = os.getpid(), os.getppid()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        for path in self.directory.glob('*.json'):
+            try:
+                owner_run, owner_pid, _ = (int(part, 16) for part in path.stem.split('-'))
+            except ValueError:
+                owner_run = owner_pid = None
+            if owner_pid is not None and _process_alive(owner_pid):
+                continue
+            if owner_run != run:
+                path.unlink(missing_ok=True)
+                continue
+
+            # A recycled worker of this run: the rename ensures only one process adopts it
+            claimed = path.with_suffix(f'.claimed-{pid:x}')
+            try:
+                os.rename(path, claimed)
+                snapshot = json.loads(claimed.read_text())
+            except (OSError, ValueError):
+                continue
+            finally:
+                claimed.unlink(missing_ok=True)
+            with self._lock:
+                _merge_snapshot(snapshot, self._counters, self._histograms)
+
+        self._pid = pid
+        self._path = self.directory / f'{run:x}-{pid:x}-{uuid.uuid4().hex[:12]}.json'
+
+    def collect(self):
+        """Merge every process's snapshot"""
+        self.flush()
+        counters, histograms = {}, {}
+        for path in self.directory.glob('*.json'):
+            try:
+                snapshot = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            _merge_snapshot(snapshot, counters, histograms)
+        return counters, histograms
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge_snapshot(snapshot, counters, histograms):
+    for name, labels, value in snapshot['counters']:
+        key = (name, tuple(tuple(label) for label in labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, counts, total in snapshot['histograms']:
+        key = (name, tuple(tuple(label) for label in labels))
+        merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+        merged[0] = [a + b for a, b in zip(merged[0], counts)]
+        merged[1] += total
+
+
+registry = MetricsRegistry(settings.LIBRARY_METRICS_DIR)
+
+
+def _format_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in items
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(counters, histograms, gauges):
+    series = {}
+    for (name, labels), value in counters.items():
+        series.setdefault(name, []).append(
+            (labels, 0, f'{name}{_format_labels(labels)} {_format_value(value)}')
+        )
+    for (name, labels), (counts, total) in histograms.items():
+        lines = series.setdefault(name, [])
+        cumulative = 0
+        for position, (bound, count) in enumerate(zip(LATENCY_BUCKETS + ('+Inf',), counts)):
+            cumulative += count
+            lines.append((labels, position, f'{name}_bucket{_format_labels(labels, le=bound)} {cumulative}'))
+        lines.append((labels, len(counts), f'{name}_sum{_format_labels(labels)} {_format_value(total)}'))
+        lines.append((labels, len(counts) + 1, f'{name}_count{_format_labels(labels)} {cumulative}'))
+    for name, value in gauges.items():
+        series.setdefault(name, []).append(((), 0, f'{name} {_format_value(value)}'))
+
+    output = []
+    for name in sorted(series):
+        kind, description = HELP.get(name, ('untyped', name))
+        output.append(f'# HELP {name} {description}')
+        output.append(f'# TYPE {name} {kind}')
+        output.extend(line for labels, position, line in sorted(series[name], key=lambda s: s[:2]))
+    return '\n'.join(output) + '\n'
+
+
+def metrics_view(request):
+    """Expose all workers' metrics in Prometheus text format"""
+    from .models import LibraryUser
+
+    counters, histograms = registry.collect()
+    fines = LibraryUser.objects.aggregate(total=Sum('fines'))['total'] or 0
+    body = render(counters, histograms, {'library_fines_outstanding': float(fines)})
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+_endpoint_prefixes = None
+
+
+def endpoint_label(request):
+    """Label a request as '<router prefix>.<action>', e.g. 'books.borrow'"""
+    global _endpoint_prefixes
+
+    match = request.resolver_match
+    if match is None:
+        return 'unmatched'
+    view_class = getattr(match.func, 'cls', None)
+    actions = getattr(match.func, 'actions', None)
+    if view_class is None or not actions:
+        return match.url_name or match.view_name or 'other'
+
+    if _endpoint_prefixes is None:
+        from .urls import router
+        _endpoint_prefixes = {viewset: prefix for prefix, viewset, basename in router.registry}
+    prefix = _endpoint_prefixes.get(view_class, view_class.__name__)
+    return f'{prefix}.{actions.get(request.method.lower(), request.method.lower())}'
+
+
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        start = time.perf_counter()
+        status_code = 500
+        try:
+            with connection.execute_wrapper(timer):
+                response = self.get_response(request)
+            status_code = response.status_code
+            return response
+        finally:
+            endpoint = endpoint_label(request)
+            if endpoint != 'metrics':
+                registry.observe(
+                    'library_request_duration_seconds', time.perf_counter() - start,
+                    endpoint=endpoint
+                )
+                if status_code >= 400:
+                    registry.inc('library_request_errors_total', endpoint=endpoint, status=status_code)
+                if timer.count:
+                    registry.inc('library_db_queries_total', timer.count, endpoint=endpoint)
+                    registry.inc('library_db_query_seconds_total', timer.duration, endpoint=endpoint)
+                registry.maybe_flush()
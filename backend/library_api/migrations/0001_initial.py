@@ -0,0 +1,104 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Book',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200)),
+                ('author', models.CharField(max_length=100)),
+                ('isbn', models.CharField(blank=True, max_length=20, null=True, unique=True)),
+                ('sub_category', models.CharField(blank=True, max_length=100)),
+                ('publisher', models.CharField(blank=True, max_length=100)),
+                ('year', models.IntegerField()),
+                ('copies', models.PositiveIntegerField(default=1)),
+                ('available', models.PositiveIntegerField(default=1)),
+                ('location', models.CharField(blank=True, max_length=50)),
+                ('description', models.TextField(blank=True)),
+                ('tags', models.JSONField(default=list)),
+                ('rating', models.DecimalField(decimal_places=1, default=0.0, max_digits=3)),
+                ('popularity', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['title'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('code', models.CharField(max_length=10, unique=True)),
+                ('description', models.TextField(blank=True)),
+                ('sub_categories', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Categories',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LibraryUser',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('student_id', models.CharField(blank=True, max_length=20, null=True)),
+                ('employee_id', models.CharField(blank=True, max_length=20, null=True)),
+                ('department', models.CharField(max_length=100)),
+                ('year', models.IntegerField(blank=True, null=True)),
+                ('role', models.CharField(choices=[('student', 'Student'), ('admin', 'Admin')], default='student', max_length=10)),
+                ('join_date', models.DateField()),
+                ('phone', models.CharField(blank=True, max_length=15)),
+                ('address', models.TextField(blank=True)),
+                ('fines', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Transaction',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('type', models.CharField(choices=[('borrow', 'Borrow'), ('return', 'Return'), ('renew', 'Renew')], max_length=10)),
+                ('borrow_date', models.DateField()),
+                ('due_date', models.DateField()),
+                ('return_date', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('borrowed', 'Borrowed'), ('returned', 'Returned'), ('overdue', 'Overdue')], default='borrowed', max_length=10)),
+                ('fine_amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('renewal_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='library_api.book')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='library_api.libraryuser')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='books', to='library_api.category'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_api', '0004_tag_booktag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='libraryuser',
+            name='active_loans',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='libraryuser',
+            name='last_activity',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='libraryuser',
+            name='overdue_loans',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='libraryuser',
+            index=models.Index(fields=['-active_loans', 'name'], name='user_active_loans_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='libraryuser',
+            index=models.Index(fields=['-overdue_loans', 'name'], name='user_overdue_loans_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='libraryuser',
+            index=models.Index(fields=['-last_activity'], name='user_last_activity_idx'),
+        ),
+    ]
@@ -1,4 +1,8 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 import uuid
 
@@ -10,7 +14,7 @@ class Category(models.Model):
     description = models.TextField(blank=True)
     sub_categories = models.JSONField(default=list)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -23,7 +27,7 @@ class Category(models.Model):
 class Book(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     title = models.CharField(max_length=200)
-    author = models.CharField(max_length=100)
+    author = models.CharField(max_length=100, db_index=True)
     isbn = models.CharField(max_length=20, unique=True, blank=True, null=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='books')
     sub_category = models.CharField(max_length=100, blank=True)
@@ -37,14 +41,62 @@ class Book(models.Model):
     rating = models.DecimalField(max_digits=3, decimal_places=1, default=0.0)
     popularity = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['title']
+        indexes = [
+            models.Index(fields=['title', '-id'], name='book_title_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} by {self.author}"
 
+    def sync_tags(self):
+        """Mirror the tags JSON list into the normalized BookTag index"""
+        names = {Tag.normalize(tag) for tag in self.tags or [] if isinstance(tag, str)}
+        names.discard('')
+        current = set(self.book_tags.values_list('tag__name', flat=True))
+        if names == current:
+            return
+
+        self.book_tags.exclude(tag__name__in=names).delete()
+        missing = names - current
+        if missing:
+            Tag.objects.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+            BookTag.objects.bulk_create(
+                [BookTag(book=self, tag=tag) for tag in Tag.objects.filter(name__in=missing)],
+                ignore_conflicts=True
+            )
+
+
+class Tag(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    @staticmethod
+    def normalize(name):
+        return ' '.join(name.split()).lower()[:50]
+
+
+class BookTag(models.Model):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='book_tags')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='book_tags')
+
+    class Meta:
+        unique_together = ['book', 'tag']
+        indexes = [
+            models.Index(fields=['tag', 'book'], name='booktag_tag_book_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} - {self.tag_id}"
+
 
 class LibraryUser(models.Model):
     ROLE_CHOICES = [
@@ -55,9 +107,9 @@ class LibraryUser(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
-    student_id = models.CharField(max_length=20, blank=True, null=True)
-    employee_id = models.CharField(max_length=20, blank=True, null=True)
-    department = models.CharField(max_length=100)
+    student_id = models.CharField(max_length=20, blank=True, null=True, db_index=True)
+    employee_id = models.CharField(max_length=20, blank=True, null=True, db_index=True)
+    department = models.CharField(max_length=100, db_index=True)
     year = models.IntegerField(blank=True, null=True)
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='student')
     join_date = models.DateField()
@@ -65,15 +117,49 @@ class LibraryUser(models.Model):
     address = models.TextField(blank=True)
     fines = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     is_active = models.BooleanField(default=True)
+    # Loan summary, kept in step by the borrow/return/overdue views
+    active_loans = models.PositiveIntegerField(default=0)
+    overdue_loans = models.PositiveIntegerField(default=0)
+    last_activity = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', '-id'], name='user_name_id_idx'),
+            models.Index(fields=['-active_loans', 'name'], name='user_active_loans_idx'),
+            models.Index(fields=['-overdue_loans', 'name'], name='user_overdue_loans_idx'),
+            models.Index(fields=['-last_activity'], name='user_last_activity_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.role})"
 
+    @property
+    def loan_limit(self):
+        return settings.LIBRARY_LOAN_LIMITS.get(self.role, 0)
+
+    @classmethod
+    def refresh_loan_counts(cls, queryset=None):
+        """Recompute active/overdue loan counts from transactions in one UPDATE"""
+        def loan_count(statuses):
+            loans = (
+                Transaction.objects.filter(user=OuterRef('pk'), status__in=statuses)
+                .order_by()
+                .values('user')
+                .annotate(count=Count('id'))
+                .values('count')
+            )
+            return Coalesce(Subquery(loans), 0)
+
+        queryset = cls.objects.all() if queryset is None else queryset
+        return queryset.update(
+            active_loans=loan_count(['borrowed', 'overdue']),
+            overdue_loans=loan_count(['overdue']),
+            updated_at=timezone.now()
+        )
+
 
 class Transaction(models.Model):
     TYPE_CHOICES = [
@@ -92,17 +178,34 @@ class Transaction(models.Model):
     user = models.ForeignKey(LibraryUser, on_delete=models.CASCADE, related_name='transactions')
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='transactions')
     type = models.CharField(max_length=10, choices=TYPE_CHOICES)
-    borrow_date = models.DateField()
+    borrow_date = models.DateField(db_index=True)
     due_date = models.DateField()
     return_date = models.DateField(blank=True, null=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='borrowed')
     fine_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     renewal_count = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='txn_created_id_idx'),
+            models.Index(fields=['status', 'due_date'], name='txn_status_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.name} - {self.book.title} ({self.status})"
+
+
+class DeletedRecord(models.Model):
+    """Tombstone for a deleted row, so snapshot deltas can report deletions"""
+    collection = models.CharField(max_length=20)
+    object_id = models.UUIDField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['deleted_at']
 
     def __str__(self):
-        return f"{self.user.name} - {self.book.title} ({self.status})"
\ No newline at end of file
+        return f"{self.collection} {self.object_id}"
@@ -25,6 +25,7 @@ class LibraryUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = LibraryUser
         fields = '__all__'
+        read_only_fields = ['active_loans', 'overdue_loans', 'last_activity']
 
 
 class TransactionSerializer(serializers.ModelSerializer):
@@ -57,5 +58,6 @@ class UserListSerializer(serializers.ModelSerializer):
         model = LibraryUser
         fields = [
             'id', 'name', 'email', 'student_id', 'employee_id', 
-            'department', 'year', 'role', 'fines', 'is_active'
+            'department', 'year', 'role', 'fines', 'is_active',
+            'active_loans', 'overdue_loans', 'last_activity'
         ]
\ No newline at end of file
@@ -0,0 +1,43 @@
+import time
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Book, Category, DeletedRecord, LibraryUser, Transaction
+from .snapshot import DELETED_RETENTION, SNAPSHOT_COLLECTIONS
+from .suggest import INDEXED_FIELDS, book_index
+
+# Expired tombstones are pruned at most this often (seconds), not on every delete
+PRUNE_INTERVAL = 60
+
+_last_prune = None
+
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'tags' in update_fields:
+        instance.sync_tags()
+    # Circulation saves only touch availability; leave the suggest index alone
+    if update_fields is None or INDEXED_FIELDS & set(update_fields):
+        transaction.on_commit(lambda: book_index.update(instance))
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, **kwargs):
+    book_id = instance.id
+    transaction.on_commit(lambda: book_index.remove(book_id))
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=LibraryUser)
+@receiver(post_delete, sender=Transaction)
+def record_deletion(sender, instance, **kwargs):
+    global _last_prune
+
+    now = time.monotonic()
+    if _last_prune is None or now - _last_prune >= PRUNE_INTERVAL:
+        _last_prune = now
+        DeletedRecord.objects.filter(deleted_at__lt=timezone.now() - DELETED_RETENTION).delete()
+    DeletedRecord.objects.create(collection=SNAPSHOT_COLLECTIONS[sender], object_id=instance.pk)
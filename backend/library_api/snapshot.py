@@ -0,0 +1,156 @@
+"""
+Consolidated, versioned snapshot of the catalog for the frontend.
+
+The version is the newest updated_at across all collections (as epoch
+microseconds), so a client can ask for rows changed after the version it
+already holds. Deltas re-send a short overlap before that version, so rows
+committed out of order are not lost; merging them is idempotent. Deleted
+rows are reported from DeletedRecord tombstones.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Book, Category, DeletedRecord, LibraryUser, Transaction
+
+# Returned loans older than this are left to the paginated transactions API.
+RECENT_TRANSACTIONS = timedelta(days=30)
+# Deltas re-send rows updated this long before the client's version.
+DELTA_OVERLAP = timedelta(seconds=30)
+# Tombstones are kept this long; older versions get a full snapshot instead.
+DELETED_RETENTION = timedelta(days=30)
+
+SNAPSHOT_COLLECTIONS = {
+    Book: 'books',
+    LibraryUser: 'users',
+    Category: 'categories',
+    Transaction: 'transactions',
+}
+
+BOOK_FIELDS = [
+    'id', 'title', 'author', 'category', 'sub_category', 'year', 'copies', 'available',
+    'rating', 'popularity', 'tags', 'description', 'location', 'updated_at'
+]
+USER_FIELDS = [
+    'id', 'name', 'email', 'student_id', 'employee_id', 'department', 'year', 'role',
+    'fines', 'is_active', 'active_loans', 'overdue_loans', 'last_activity', 'updated_at'
+]
+CATEGORY_FIELDS = [
+    'id', 'name', 'code', 'description', 'sub_categories', 'created_at', 'updated_at'
+]
+TRANSACTION_FIELDS = [
+    'id', 'user', 'book', 'type', 'borrow_date', 'due_date', 'return_date', 'status',
+    'fine_amount', 'renewal_count', 'created_at', 'updated_at'
+]
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def version_to_datetime(version):
+    """Raises ValueError or OverflowError for versions outside the datetime range"""
+    return EPOCH + timedelta(microseconds=int(version))
+
+
+def datetime_to_version(value):
+    if value is None:
+        return 0
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def snapshot_etag(since=None):
+    """
+    ETag from the newest updated_at/deleted_at per table, all index-backed lookups.
+
+    Until DELTA_OVERLAP has passed since the newest change, a row stamped
+    earlier may still commit without moving any MAX(). The tag therefore
+    also records whether the state has settled, so validators handed out
+    before then stop matching and the client refetches the late rows.
+    """
+    columns = [(model, 'updated_at') for model in SNAPSHOT_COLLECTIONS]
+    columns.append((DeletedRecord, 'deleted_at'))
+    quote = connection.ops.quote_name
+    newest = [
+        f'(SELECT MAX({quote(column)}) FROM {quote(model._meta.db_table)})'
+        for model, column in columns
+    ]
+    settling = [
+        f'EXISTS(SELECT 1 FROM {quote(model._meta.db_table)} WHERE {quote(column)} >= %s)'
+        for model, column in columns
+    ]
+    sql = 'SELECT ' + ', '.join(newest) + ', ' + ' OR '.join(settling)
+    cutoff = connection.ops.adapt_datetimefield_value(timezone.now() - DELTA_OVERLAP)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [cutoff] * len(columns))
+        *state, unsettled = cursor.fetchone()
+
+    parts = [str(value) for value in state] + [f'since:{since}', f'settled:{not unsettled}']
+    return '"' + hashlib.md5(';'.join(parts).encode()).hexdigest() + '"'
+
+
+def build_snapshot(since=None):
+    """Fetch every collection with one .values() query each"""
+    if since is not None and version_to_datetime(since) < timezone.now() - DELETED_RETENTION:
+        # Tombstones for that far back are gone; the client needs everything
+        since = None
+
+    changed = Q()
+    if since is not None:
+        changed = Q(updated_at__gte=version_to_datetime(since) - DELTA_OVERLAP)
+
+    books = Book.objects.order_by().filter(changed).values(
+        *BOOK_FIELDS, category_name=F('category__name')
+    )
+    users = LibraryUser.objects.order_by().filter(changed).values(*USER_FIELDS)
+    categories = Category.objects.order_by().filter(changed).values(*CATEGORY_FIELDS)
+
+    transactions = Transaction.objects.filter(changed)
+    if since is None:
+        transactions = transactions.filter(
+            Q(status__in=['borrowed', 'overdue']) |
+            Q(updated_at__gte=timezone.now() - RECENT_TRANSACTIONS)
+        )
+    transactions = transactions.values(
+        *TRANSACTION_FIELDS,
+        user_name=F('user__name'),
+        book_title=F('book__title'),
+        book_author=F('book__author')
+    )
+
+    snapshot = {
+        'since': since,
+        'books': list(books),
+        'users': list(users),
+        'categories': list(categories),
+        'transactions': list(transactions),
+        'deleted': {name: [] for name in SNAPSHOT_COLLECTIONS.values()},
+    }
+
+    latest = [row['updated_at'] for name in SNAPSHOT_COLLECTIONS.values() for row in snapshot[name]]
+    if since is not None:
+        tombstones = DeletedRecord.objects.filter(
+            deleted_at__gte=version_to_datetime(since) - DELTA_OVERLAP
+        ).values_list('collection', 'object_id', 'deleted_at')
+        for collection, object_id, deleted_at in tombstones:
+            snapshot['deleted'][collection].append(object_id)
+            latest.append(deleted_at)
+
+    version = datetime_to_version(max(latest)) if latest else 0
+    snapshot['version'] = max(version, since or 0)
+    return snapshot
+
+
+def dashboard_stats(snapshot):
+    """Headline numbers derived from a full snapshot without extra queries"""
+    books = snapshot['books']
+    transactions = snapshot['transactions']
+    return {
+        'total_books': sum(book['copies'] for book in books),
+        'available_books': sum(book['available'] for book in books),
+        'borrowed_books': sum(1 for t in transactions if t['status'] in ('borrowed', 'overdue')),
+        'overdue_books': sum(1 for t in transactions if t['status'] == 'overdue'),
+        'total_users': len(snapshot['users']),
+        'active_users': sum(1 for user in snapshot['users'] if user['is_active']),
+        'total_fines': sum(user['fines'] for user in snapshot['users']),
+    }
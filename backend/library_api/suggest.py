@@ -0,0 +1,497 @@
+"""
+In-process prefix index for book typeahead suggestions.
+
+Tokens from each book's title, author and tags are kept in a sorted list so a
+prefix lookup is a bisect plus a short forward scan. Numeric tokens (ISBNs,
+years) go into a sorted integer array instead, so half a million unique ISBNs
+don't each cost a string and a posting list. Postings are compact integer
+arrays of book slots; updates tombstone the old slot and append a new one,
+and tombstones are compacted once they pile up.
+
+A prefix matching more than HEAVY_PREFIX postings ("a", "978") keeps a
+popularity-ordered top list that book updates maintain, so a single prefix
+never ranks more than HEAVY_PREFIX books. The index is built in a background
+thread on first use; suggestions are empty until it is ready.
+"""
+import heapq
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from .metrics import registry as metrics
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+TOKEN_CHARS = 'abcdefghijklmnopqrstuvwxyz0123456789'
+
+# Reconcile with rows written by other worker processes at most this often.
+REFRESH_INTERVAL = 5.0
+# Re-read rows this far behind the watermark, for saves that commit out of order.
+REFRESH_OVERLAP = timedelta(seconds=30)
+# Check for books deleted by other processes at most this often.
+RECONCILE_INTERVAL = 60.0
+RESULT_CACHE_SIZE = 1024
+# A refresh changing more rows than this drops the whole result cache.
+BULK_CHANGE = 256
+MAX_SUGGESTIONS = 50
+# Prefixes with more postings than this are served from a top list.
+HEAVY_PREFIX = 1000
+TOP_SIZE = 2 * MAX_SUGGESTIONS
+# Queries whose terms are all heavy check at most this many top-ranked books.
+HEAVY_SCAN = 20000
+# Numeric tokens are base-11 integers (digit + 1, zero padded), so integer
+# order matches string order and a prefix is one contiguous range.
+NUMBER_DIGITS = 17
+NUMBER_SHIFT = str.maketrans('0123456789', '123456789a')
+INDEXED_FIELDS = {'title', 'author', 'isbn', 'tags', 'popularity'}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def stamp(updated_at):
+    """updated_at as integer microseconds, for compact per-slot storage"""
+    if updated_at is None:
+        return 0
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return (updated_at - EPOCH) // timedelta(microseconds=1)
+
+
+def id_bytes(book_id):
+    """Book ids are kept as 16-byte UUIDs rather than 36-character strings"""
+    if not isinstance(book_id, uuid.UUID):
+        book_id = uuid.UUID(str(book_id))
+    return book_id.bytes
+
+
+def normalize(text):
+    """Lowercase and strip accents so 'Café' and 'cafe' share tokens"""
+    text = unicodedata.normalize('NFKD', str(text))
+    return ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+def book_tokens(title, author, isbn, tags):
+    tokens = set(tokenize(title)) | set(tokenize(author))
+    for tag in tags or []:
+        tokens.update(tokenize(tag))
+    if isbn:
+        tokens.add(''.join(TOKEN_RE.findall(normalize(isbn))))
+    tokens.discard('')
+    return tokens
+
+
+def is_number(token):
+    return token.isdigit() and len(token) <= NUMBER_DIGITS
+
+
+def number_key(digits):
+    return int(digits.translate(NUMBER_SHIFT).ljust(NUMBER_DIGITS, '0'), 11)
+
+
+class BookSuggestIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._loader = None
+        # Signals received while a load is running, replayed once it is swapped in
+        self._pending = None
+        self._reset()
+
+    def _reset(self):
+        self._ids = []
+        # ' <tokens> \0<title>': the tokens answer multi-term matches, the title is returned
+        self._docs = []
+        # popularity << 32 | slot, a strict ranking that breaks ties by slot
+        self._rank = array('q')
+        self._stamps = array('q')
+        # Every slot, best ranked first, for queries whose terms are all heavy
+        self._ranked = array('I')
+        self._slot_by_id = {}
+        self._postings = {}
+        self._tokens = []
+        self._number_keys = array('q')
+        self._number_slots = array('I')
+        self._top = {}
+        self._dead = 0
+        self._watermark = None
+        self._last_refresh = 0.0
+        self._last_reconcile = 0.0
+        self._results = OrderedDict()
+
+    def _fields(self):
+        return ('id', 'title', 'author', 'isbn', 'tags', 'popularity', 'updated_at')
+
+    def load(self):
+        """Build the index from the database to the side, then swap it in"""
+        from .models import Book
+
+        with self._lock:
+            self._pending = []
+        try:
+            fresh = BookSuggestIndex()
+            rows = Book.objects.order_by().values_list(*self._fields())
+            for row in rows.iterator(chunk_size=2000):
+                fresh._add(*row, bulk=True)
+                fresh._advance_watermark(row[-1])
+            fresh._finish_bulk()
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            pending, self._pending = self._pending, None
+            for name, value in vars(fresh).items():
+                if name not in ('_lock', '_loaded', '_loader', '_pending'):
+                    setattr(self, name, value)
+            for book_id, row in pending:
+                if row is None:
+                    self._tombstone(id_bytes(book_id))
+                else:
+                    self._add(*row)
+            self._maybe_compact()
+            self._last_refresh = self._last_reconcile = time.monotonic()
+            self._loaded = True
+
+    def _load_in_background(self):
+        from django.db import connection
+
+        try:
+            self.load()
+        finally:
+            connection.close()
+            with self._lock:
+                self._loader = None
+
+    def ensure_loaded(self):
+        """Start the background build on first use; True once suggestions can be served"""
+        if not self._loaded:
+            with self._lock:
+                if self._loader is None and not self._loaded:
+                    self._loader = threading.Thread(
+                        target=self._load_in_background, name='book-suggest-load', daemon=True
+                    )
+                    self._loader.start()
+            return self._loaded
+        if time.monotonic() - self._last_refresh > REFRESH_INTERVAL:
+            self.refresh()
+        return True
+
+    def refresh(self):
+        """Pick up books saved or deleted by other processes"""
+        from .models import Book
+
+        with self._lock:
+            now = time.monotonic()
+            self._last_refresh = now
+            rows = Book.objects.order_by()
+            if self._watermark is not None:
+                rows = rows.filter(updated_at__gte=self._watermark - REFRESH_OVERLAP)
+            rows = list(rows.values_list(*self._fields()))
+            if len(rows) > BULK_CHANGE:
+                self._results.clear()
+            for row in rows:
+                self._add(*row)
+                self._advance_watermark(row[-1])
+
+            if now - self._last_reconcile > RECONCILE_INTERVAL:
+                self._last_reconcile = now
+                if Book.objects.count() != len(self._slot_by_id):
+                    self._reconcile(Book.objects.values_list('id', flat=True))
+
+    def _reconcile(self, book_ids):
+        """Drop books that no longer exist in the database"""
+        existing = {id_bytes(book_id) for book_id in book_ids}
+        for key in [key for key in self._slot_by_id if key not in existing]:
+            self._tombstone(key)
+        self._maybe_compact()
+
+    def _advance_watermark(self, updated_at):
+        # Only rows read from the database move the watermark; a local save
+        # must not skip past rows other processes committed before it.
+        if updated_at and (self._watermark is None or updated_at > self._watermark):
+            self._watermark = updated_at
+
+    def _add(self, book_id, title, author, isbn, tags, popularity, updated_at, bulk=False):
+        key = id_bytes(book_id)
+        current = self._slot_by_id.get(key)
+        if current is not None and self._stamps[current] >= stamp(updated_at):
+            return
+        self._tombstone(key)
+
+        slot = len(self._ids)
+        tokens = sorted(book_tokens(title, author, isbn, tags))
+        self._ids.append(key)
+        self._docs.append(' ' + ' '.join(tokens) + ' \0' + title)
+        self._rank.append((popularity or 0) << 32 | slot)
+        self._stamps.append(stamp(updated_at))
+        self._slot_by_id[key] = slot
+
+        for token in tokens:
+            if is_number(token):
+                self._add_number(number_key(token), slot, current, bulk)
+                continue
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = array('I')
+                if not bulk:
+                    insort(self._tokens, token)
+            postings.append(slot)
+
+        if not bulk:
+            prefixes = {token[:end] for token in tokens for end in range(1, len(token) + 1)}
+            for prefix in prefixes:
+                top = self._top.get(prefix)
+                if top is not None:
+                    self._promote(top, slot)
+            insort(self._ranked, slot, key=self._rank_order)
+            self._forget_results(slot)
+            self._maybe_compact()
+
+    def _add_number(self, number, slot, previous, bulk):
+        keys, slots = self._number_keys, self._number_slots
+        if bulk:
+            keys.append(number)
+            slots.append(slot)
+            return
+        position = bisect_left(keys, number)
+        end = bisect_right(keys, number, position)
+        # An unchanged ISBN takes over the previous slot's entry in place
+        for candidate in range(position, end):
+            if slots[candidate] == previous:
+                slots[candidate] = slot
+                return
+        keys.insert(end, number)
+        slots.insert(end, slot)
+
+    def _finish_bulk(self):
+        """Sort what bulk adds appended and precompute every heavy prefix's top list"""
+        self._tokens = sorted(self._postings)
+        keys, slots = self._number_keys, self._number_slots
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self._number_keys = array('q', (keys[i] for i in order))
+        self._number_slots = array('I', (slots[i] for i in order))
+        self._ranked = array('I', sorted(range(len(self._ids)), key=self._rank_order))
+        for char in TOKEN_CHARS:
+            if self._prefix_slots(char, HEAVY_PREFIX) is None:
+                self._build_top(char)
+
+    def _tombstone(self, key):
+        slot = self._slot_by_id.pop(key, None)
+        if slot is None:
+            return
+        self._ids[slot] = None
+        self._docs[slot] = None
+        self._dead += 1
+        self._forget_results(slot)
+
+    def _maybe_compact(self):
+        if self._dead > max(1000, len(self._slot_by_id) // 4):
+            self._compact()
+
+    def _compact(self):
+        """Renumber live slots and drop tombstoned postings"""
+        remap = array('q', [-1]) * len(self._ids)
+        ids, docs, rank, stamps = [], [], array('q'), array('q')
+        for slot, key in enumerate(self._ids):
+            if key is not None:
+                remap[slot] = len(ids)
+                ids.append(key)
+                docs.append(self._docs[slot])
+                rank.append(self._rank[slot] >> 32 << 32 | remap[slot])
+                stamps.append(self._stamps[slot])
+
+        def renumber(slots):
+            return array('I', (remap[s] for s in slots if remap[s] >= 0))
+
+        postings = {}
+        for token, slots in self._postings.items():
+            live = renumber(slots)
+            if live:
+                postings[token] = live
+        numbers = [(key, remap[s]) for key, s in zip(self._number_keys, self._number_slots) if remap[s] >= 0]
+
+        self._ids, self._docs, self._rank, self._stamps = ids, docs, rank, stamps
+        self._slot_by_id = {key: slot for slot, key in enumerate(ids)}
+        self._postings = postings
+        self._tokens = sorted(postings)
+        self._number_keys = array('q', (key for key, slot in numbers))
+        self._number_slots = array('I', (slot for key, slot in numbers))
+        # Renumbering keeps rank order, so the ranked slots and top lists stay sorted
+        self._ranked = renumber(self._ranked)
+        self._top = {prefix: renumber(top) for prefix, top in self._top.items()}
+        self._results.clear()
+        self._dead = 0
+
+    def _number_range(self, prefix, exact=False):
+        if not is_number(prefix):
+            return 0, 0
+        low = number_key(prefix)
+        high = low + (1 if exact else 11 ** (NUMBER_DIGITS - len(prefix)))
+        return bisect_left(self._number_keys, low), bisect_left(self._number_keys, high)
+
+    def _prefix_slots(self, prefix, budget=None):
+        """Slots with a token starting with prefix, or None past `budget` postings"""
+        low, high = self._number_range(prefix)
+        count = high - low
+        if budget is not None and count > budget:
+            return None
+        slots = set(self._number_slots[low:high])
+
+        tokens = self._tokens
+        for position in range(bisect_left(tokens, prefix), len(tokens)):
+            token = tokens[position]
+            if not token.startswith(prefix):
+                break
+            postings = self._postings[token]
+            count += len(postings)
+            if budget is not None and count > budget:
+                return None
+            slots.update(postings)
+        return slots
+
+    def _build_top(self, prefix):
+        """Rank a heavy prefix's books from its children, building their top lists too"""
+        slots = set(self._postings.get(prefix, ()))
+        low, high = self._number_range(prefix, exact=True)
+        slots.update(self._number_slots[low:high])
+        for char in TOKEN_CHARS:
+            child = prefix + char
+            child_slots = self._prefix_slots(child, HEAVY_PREFIX)
+            slots.update(self._build_top(child) if child_slots is None else child_slots)
+
+        ids = self._ids
+        top = heapq.nlargest(
+            TOP_SIZE, (slot for slot in slots if ids[slot] is not None), key=self._rank.__getitem__
+        )
+        self._top[prefix] = array('I', top)
+        return top
+
+    def _top_slots(self, prefix):
+        """Live top list for a heavy prefix, rebuilt once deletions thin it out"""
+        top = self._top.get(prefix)
+        if top is not None:
+            live = [slot for slot in top if self._ids[slot] is not None]
+            if len(live) >= MAX_SUGGESTIONS:
+                return live
+        return self._build_top(prefix)
+
+    def _rank_order(self, slot):
+        return -self._rank[slot]
+
+    def _promote(self, top, slot):
+        # Invariant: every book left out of a top list ranks below its last entry
+        if not top or self._rank[slot] < self._rank[top[-1]]:
+            return
+        insort(top, slot, key=self._rank_order)
+        if len(top) > TOP_SIZE:
+            top[:] = array('I', (s for s in top if self._ids[s] is not None))
+            del top[TOP_SIZE:]
+
+    def _matches(self, slot, terms):
+        doc = self._docs[slot]
+        end = doc.index('\0')
+        return all(doc.find(' ' + term, 0, end) >= 0 for term in terms)
+
+    def _title(self, slot):
+        doc = self._docs[slot]
+        return doc[doc.index('\0') + 1:]
+
+    def _forget_results(self, slot):
+        """Drop cached results a removed slot was in, or a new slot could now be in"""
+        if not self._results:
+            return
+        if self._ids[slot] is None:
+            stale = [key for key, (slots, results) in self._results.items() if slot in slots]
+        else:
+            stale = [key for key in self._results if self._matches(slot, key[0])]
+        for key in stale:
+            del self._results[key]
+
+    def _search(self, terms, limit):
+        rank = self._rank
+        light = []
+        for term in terms:
+            slots = None if term in self._top else self._prefix_slots(term, HEAVY_PREFIX)
+            if slots is not None:
+                light.append((len(slots), term, slots))
+
+        if light:
+            size, term, slots = min(light)
+            rest = [other for other in terms if other != term]
+            matches = (s for s in slots if self._ids[s] is not None and self._matches(s, rest))
+            return heapq.nlargest(limit, matches, key=rank.__getitem__)
+
+        if len(terms) == 1:
+            return self._top_slots(terms[0])[:limit]
+
+        # Every term is heavy, so matches are common: take them in rank order
+        hits = []
+        for slot in self._ranked[:HEAVY_SCAN]:
+            if self._ids[slot] is not None and self._matches(slot, terms):
+                hits.append(slot)
+                if len(hits) == limit:
+                    return hits
+        if len(self._ranked) <= HEAVY_SCAN:
+            return hits
+        # Rare combinations fall back to ranking the longest term's books
+        term, rest = terms[0], terms[1:]
+        matches = (
+            s for s in self._prefix_slots(term) if self._ids[s] is not None and self._matches(s, rest)
+        )
+        return heapq.nlargest(limit, matches, key=rank.__getitem__)
+
+    def update(self, book):
+        row = (book.id, book.title, book.author, book.isbn, book.tags, book.popularity, book.updated_at)
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((book.id, row))
+            elif self._loaded:
+                self._add(*row)
+
+    def remove(self, book_id):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((book_id, None))
+            elif self._loaded:
+                self._tombstone(id_bytes(book_id))
+                self._maybe_compact()
+
+    def suggest(self, query, limit=10):
+        """Return up to `limit` books matching every query term as a prefix"""
+        terms = tuple(sorted(set(tokenize(query)), key=lambda term: (-len(term), term)))
+        if not terms or not self.ensure_loaded():
+            return []
+        limit = min(limit, MAX_SUGGESTIONS)
+
+        key = (terms, limit)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                self._results.move_to_end(key)
+                metrics.inc('library_cache_requests_total', cache='book_suggest', result='hit')
+                return cached[1]
+            metrics.inc('library_cache_requests_total', cache='book_suggest', result='miss')
+
+            slots = self._search(terms, limit)
+            results = [
+                {'id': str(uuid.UUID(bytes=self._ids[slot])), 'title': self._title(slot)}
+                for slot in slots
+            ]
+
+            self._results[key] = (slots, results)
+            if len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+            return results
+
+
+book_index = BookSuggestIndex()
@@ -0,0 +1,555 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date, timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import addModuleCleanup, mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import metrics
+from .metrics import MetricsRegistry
+from .models import Book, Category, DeletedRecord, LibraryUser, Transaction
+from .snapshot import DELTA_OVERLAP, version_to_datetime
+from .suggest import BookSuggestIndex, book_index
+from .views import TransactionViewSet
+
+
+def use_metrics_directory(directory):
+    """Point the process-wide registry at an empty registry in `directory`"""
+    return mock.patch.multiple(
+        metrics.registry, directory=Path(directory), _pid=None, _path=None, _counters={}, _histograms={}
+    )
+
+
+def setUpModule():
+    # Requests in every test pass through MetricsMiddleware; keep their snapshots out of the real directory
+    directory = tempfile.mkdtemp()
+    patcher = use_metrics_directory(directory)
+    patcher.start()
+    addModuleCleanup(patcher.stop)
+    addModuleCleanup(shutil.rmtree, directory, ignore_errors=True)
+
+
+def create_category(**kwargs):
+    defaults = {'name': 'Computer Science', 'code': 'CS', 'sub_categories': ['Programming']}
+    defaults.update(kwargs)
+    return Category.objects.create(**defaults)
+
+
+def create_user(index, **kwargs):
+    defaults = {
+        'name': f'User {index}',
+        'email': f'user{index}@library.test',
+        'department': 'Computer Science',
+        'join_date': date(2023, 1, 1),
+    }
+    defaults.update(kwargs)
+    return LibraryUser.objects.create(**defaults)
+
+
+def create_book(index, category, **kwargs):
+    defaults = {
+        'title': f'Book {index}',
+        'author': f'Author {index % 3}',
+        'isbn': f'978{index:07d}',
+        'category': category,
+        'sub_category': 'Programming',
+        'year': 1990 + index % 30,
+        'copies': 3,
+        'available': 3,
+    }
+    defaults.update(kwargs)
+    return Book.objects.create(**defaults)
+
+
+class AdminChangelistQueryTests(TestCase):
+    """Changelist query counts must not grow with the number of rows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@library.test', 'admin123')
+        cls.category = create_category()
+
+    def add_rows(self, start, stop):
+        for index in range(start, stop):
+            user = create_user(index)
+            book = create_book(index, self.category)
+            Transaction.objects.create(
+                user=user, book=book, type='borrow',
+                borrow_date=date(2024, 1, 1) + timedelta(days=index * 20),
+                due_date=date(2024, 1, 16) + timedelta(days=index * 20)
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_changelist_query_counts_are_constant(self):
+        self.client.force_login(self.admin)
+        urls = [
+            '/admin/library_api/book/',
+            '/admin/library_api/libraryuser/',
+            '/admin/library_api/transaction/',
+        ]
+
+        self.add_rows(0, 5)
+        small = [self.count_queries(url) for url in urls]
+        self.add_rows(5, 50)
+        large = [self.count_queries(url) for url in urls]
+
+        self.assertEqual(small, large)
+
+    def test_date_hierarchy_does_not_select_distinct_dates(self):
+        self.client.force_login(self.admin)
+        self.add_rows(0, 30)
+
+        for query in ['', '?borrow_date__year=2024', '?borrow_date__year=2024&borrow_date__month=3']:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(f'/admin/library_api/transaction/{query}')
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(any('DISTINCT' in q['sql'] for q in context.captured_queries))
+
+        response = self.client.get('/admin/library_api/transaction/')
+        self.assertContains(response, '?borrow_date__year=2025')
+
+
+class BookSuggestIndexTests(TestCase):
+    def setUp(self):
+        self.category = create_category()
+        self.index = BookSuggestIndex()
+
+    def test_refresh_picks_up_rows_saved_before_a_local_save(self):
+        self.index.load()
+        # Another worker saves X; no signal reaches this process
+        Book.objects.bulk_create([
+            Book(title='Zebra Crossing', author='Remote', category=self.category, year=2001)
+        ])
+        # This worker then saves Y, which reaches the index through its signal
+        local = create_book(1, self.category)
+        self.index.update(local)
+
+        self.index.refresh()
+        self.assertEqual([r['title'] for r in self.index.suggest('zebra')], ['Zebra Crossing'])
+
+    def test_refresh_drops_books_deleted_elsewhere(self):
+        book = create_book(1, self.category, title='Zebra Crossing')
+        self.index.load()
+        # Deleted by another worker; only the global index hears the signal
+        book.delete()
+
+        self.index._last_reconcile = 0
+        self.index.refresh()
+        self.assertEqual(self.index.suggest('zebra'), [])
+
+    def test_circulation_saves_do_not_reindex(self):
+        book = create_book(1, self.category, title='Zebra Crossing')
+        book_index.load()
+        self.addCleanup(setattr, book_index, '_loaded', False)
+        slots = len(book_index._ids)
+        with self.captureOnCommitCallbacks(execute=True):
+            book.available -= 1
+            book.save(update_fields=['available', 'updated_at'])
+        self.assertEqual(len(book_index._ids), slots)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.popularity = 5
+            book.save()
+        self.assertEqual(len(book_index._ids), slots + 1)
+
+
+    def titles(self, query, limit=10):
+        return [result['title'] for result in self.index.suggest(query, limit)]
+
+    @mock.patch.multiple('library_api.suggest', HEAVY_PREFIX=2, MAX_SUGGESTIONS=2, TOP_SIZE=4)
+    def test_heavy_prefix_top_lists_follow_updates(self):
+        books = [
+            create_book(index, self.category, title=f'Atlas {index}', popularity=index)
+            for index in range(1, 7)
+        ]
+        create_book(7, self.category, title='Zebra Crossing', author='Zed', popularity=100)
+        self.index.load()
+        self.assertIn('a', self.index._top)
+        self.assertEqual(self.titles('a', 2), ['Atlas 6', 'Atlas 5'])
+
+        books[0].popularity = 50
+        books[0].save()
+        self.index.update(books[0])
+        self.assertEqual(self.titles('at', 2), ['Atlas 1', 'Atlas 6'])
+
+        self.index.remove(books[0].id)
+        self.index.remove(books[5].id)
+        self.assertEqual(self.titles('atlas', 2), ['Atlas 5', 'Atlas 4'])
+        # Thinned below MAX_SUGGESTIONS, the top list is rebuilt
+        self.index.remove(books[4].id)
+        self.assertEqual(self.titles('atlas', 2), ['Atlas 4', 'Atlas 3'])
+        # Every term heavy: matches come from the ranked slots
+        self.assertEqual(self.titles('a 4'), ['Atlas 4'])
+
+    def test_isbn_prefixes(self):
+        create_book(1, self.category, title='Short', isbn='978-0', popularity=2)
+        create_book(2, self.category, title='Long', isbn='978-0-13', popularity=3)
+        create_book(3, self.category, title='Other', isbn='979-1', popularity=1)
+        self.index.load()
+
+        self.assertEqual(self.titles('978'), ['Long', 'Short'])
+        self.assertEqual(self.titles('97801'), ['Long'])
+        self.assertEqual(self.titles('9780'), ['Long', 'Short'])
+        self.assertEqual(self.titles('97'), ['Long', 'Short', 'Other'])
+
+    def test_writes_only_invalidate_matching_results(self):
+        zebra = create_book(1, self.category, title='Zebra Crossing')
+        other = create_book(2, self.category, title='Moby Dick')
+        self.index.load()
+        self.index.suggest('zeb')
+
+        other.popularity = 3
+        other.save()
+        self.index.update(other)
+        self.assertIn((('zeb',), 10), self.index._results)
+
+        zebra.popularity = 3
+        zebra.save()
+        self.index.update(zebra)
+        self.assertNotIn((('zeb',), 10), self.index._results)
+
+    def test_suggestions_do_not_wait_for_the_initial_load(self):
+        release = threading.Event()
+
+        def slow_load(index):
+            release.wait(5)
+            index._loaded = True
+
+        with mock.patch.object(BookSuggestIndex, 'load', slow_load):
+            self.assertEqual(self.index.suggest('zebra'), [])
+            loader = self.index._loader
+            self.assertTrue(loader.is_alive())
+            release.set()
+            loader.join(5)
+        self.assertTrue(self.index.ensure_loaded())
+        self.assertIsNone(self.index._loader)
+
+class BookTagIndexTests(TestCase):
+    def setUp(self):
+        self.category = create_category()
+
+    def tag_names(self, book):
+        return set(book.book_tags.values_list('tag__name', flat=True))
+
+    def test_sync_tags_follows_create_edit_and_removal(self):
+        book = create_book(1, self.category, tags=['Python', ' python ', 'Data  Science'])
+        self.assertEqual(self.tag_names(book), {'python', 'data science'})
+
+        book.tags = ['python', 'Web']
+        book.save()
+        self.assertEqual(self.tag_names(book), {'python', 'web'})
+
+        book.tags = []
+        book.save()
+        self.assertEqual(self.tag_names(book), set())
+
+    def test_tag_filter_and_or(self):
+        create_book(1, self.category, tags=['python', 'web'])
+        create_book(2, self.category, tags=['python'])
+        create_book(3, self.category, tags=['databases'])
+
+        def titles(query):
+            return {book['title'] for book in self.client.get(f'/api/books/{query}').json()['results']}
+
+        self.assertEqual(titles('?tag=python'), {'Book 1', 'Book 2'})
+        self.assertEqual(titles('?tag=python&tag=web'), {'Book 1'})
+        self.assertEqual(titles('?tag=web&tag=databases&tag_mode=or'), {'Book 1', 'Book 3'})
+        self.assertEqual(titles('?search=data'), {'Book 3'})
+
+    def test_facets_in_one_query(self):
+        create_book(1, self.category, tags=['python'], year=1999)
+        create_book(2, self.category, tags=['python', 'web'], year=2005, available=0)
+        create_book(3, self.category, tags=['web'], year=2001)
+
+        with self.assertNumQueries(1):
+            facets = self.client.get('/api/books/facets/?tag=python').json()
+
+        self.assertEqual(facets['category'], [{'value': 'Computer Science', 'count': 2}])
+        self.assertEqual(facets['tag'], [{'value': 'python', 'count': 2}, {'value': 'web', 'count': 1}])
+        self.assertEqual(facets['decade'], [{'value': 1990, 'count': 1}, {'value': 2000, 'count': 1}])
+        self.assertEqual(
+            facets['availability'],
+            [{'value': 'available', 'count': 1}, {'value': 'unavailable', 'count': 1}]
+        )
+
+
+class LoanSummaryTests(TestCase):
+    def setUp(self):
+        self.category = create_category()
+        self.user = create_user(1)
+        self.books = [create_book(index, self.category) for index in range(4)]
+
+    def borrow(self, book):
+        return self.client.post(
+            f'/api/books/{book.id}/borrow/', {'user_id': str(self.user.id)},
+            content_type='application/json'
+        )
+
+    @override_settings(LIBRARY_LOAN_LIMITS={'student': 2})
+    def test_borrow_limit_is_enforced(self):
+        self.assertEqual(self.borrow(self.books[0]).status_code, 200)
+        self.assertEqual(self.borrow(self.books[1]).status_code, 200)
+        response = self.borrow(self.books[2])
+
+        self.assertEqual(response.status_code, 400)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.active_loans, 2)
+        self.assertIsNotNone(self.user.last_activity)
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+
+    def test_overdue_sweep_and_return_update_counts(self):
+        self.borrow(self.books[0])
+        self.borrow(self.books[1])
+        Transaction.objects.filter(book=self.books[0]).update(due_date=date.today() - timedelta(days=3))
+
+        overdue = self.client.get('/api/transactions/overdue/').json()
+        self.assertEqual(len(overdue), 1)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.active_loans, self.user.overdue_loans), (2, 1))
+
+        loan = Transaction.objects.get(book=self.books[0])
+        response = self.client.post(f'/api/transactions/{loan.id}/return_book/')
+        self.assertEqual(response.json()['fine_amount'], 3)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.active_loans, self.user.overdue_loans), (1, 0))
+        self.assertEqual(self.user.fines, 3)
+
+    def test_return_from_stale_read_is_applied_once(self):
+        self.borrow(self.books[0])
+        self.borrow(self.books[1])
+        loan = Transaction.objects.get(book=self.books[0])
+        self.client.post(f'/api/transactions/{loan.id}/return_book/')
+
+        # A racing request that fetched the loan before it was returned
+        with mock.patch.object(TransactionViewSet, 'get_object', return_value=loan):
+            response = self.client.post(f'/api/transactions/{loan.id}/return_book/')
+
+        self.assertEqual(response.status_code, 400)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.active_loans, 1)
+        self.books[0].refresh_from_db()
+        self.assertEqual(self.books[0].available, self.books[0].copies)
+
+    def test_loan_crud_keeps_counts_in_step(self):
+        other = create_user(2)
+        self.borrow(self.books[0])
+        self.borrow(self.books[1])
+        loans = {loan.book_id: loan for loan in Transaction.objects.filter(user=self.user)}
+
+        response = self.client.patch(
+            f'/api/transactions/{loans[self.books[0].id].id}/',
+            {'user': str(other.id), 'status': 'overdue'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.client.delete(f'/api/transactions/{loans[self.books[1].id].id}/')
+
+        self.user.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.user.active_loans, self.user.overdue_loans), (0, 0))
+        self.assertEqual((other.active_loans, other.overdue_loans), (1, 1))
+
+    def test_rebuild_loan_summaries_repairs_drift(self):
+        self.borrow(self.books[0])
+        self.borrow(self.books[1])
+        Transaction.objects.filter(book=self.books[1]).update(status='overdue')
+        LibraryUser.objects.update(active_loans=7, overdue_loans=0, last_activity=None)
+
+        call_command('rebuild_loan_summaries', stdout=StringIO())
+
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.active_loans, self.user.overdue_loans), (2, 1))
+        self.assertIsNotNone(self.user.last_activity)
+
+    def test_users_sort_by_last_activity_is_stable(self):
+        create_user(2)
+        create_user(3)
+        self.borrow(self.books[0])
+
+        names = [user['name'] for user in self.client.get('/api/users/?sort_by=last_activity').json()['results']]
+        self.assertEqual(names, ['User 1', 'User 2', 'User 3'])
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    # Above the default Linux pid_max, so never a live process
+    DEAD_PID = 2 ** 22 + 1
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write_snapshot(self, run, pid, borrows):
+        path = self.directory / f'{run:x}-{pid:x}-abc.json'
+        path.write_text(json.dumps({'counters': [['library_borrows_total', [], borrows]], 'histograms': []}))
+        return path
+
+    def borrows(self, registry):
+        counters, histograms = registry.collect()
+        return counters.get(('library_borrows_total', ()), 0)
+
+    def test_files_from_previous_runs_are_removed(self):
+        stale = self.write_snapshot(os.getppid() + 1, self.DEAD_PID, 5)
+        (self.directory / '1234.json').write_text('{"counters": [], "histograms": []}')
+
+        registry = MetricsRegistry(self.directory)
+        registry.inc('library_borrows_total')
+
+        self.assertEqual(self.borrows(registry), 1)
+        self.assertFalse(stale.exists())
+        self.assertEqual(len(list(self.directory.glob('*.json'))), 1)
+
+    def test_recycled_worker_totals_are_kept(self):
+        self.write_snapshot(os.getppid(), self.DEAD_PID, 5)
+
+        registry = MetricsRegistry(self.directory)
+        registry.inc('library_borrows_total')
+
+        self.assertEqual(self.borrows(registry), 6)
+        self.assertEqual(len(list(self.directory.glob('*.json'))), 1)
+
+    def test_processes_never_share_a_file(self):
+        first, second = MetricsRegistry(self.directory), MetricsRegistry(self.directory)
+        first.inc('library_borrows_total', 2)
+        second.inc('library_borrows_total', 3)
+        first.flush()
+        second.flush()
+
+        self.assertEqual(self.borrows(first), 5)
+
+
+class MetricsEndpointTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        patcher = use_metrics_directory(directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_borrow_is_reported(self):
+        user = create_user(1, fines=12)
+        book = create_book(1, create_category())
+        self.client.post(f'/api/books/{book.id}/borrow/', {'user_id': str(user.id)}, content_type='application/json')
+        self.client.post(f'/api/books/{book.id}/borrow/', {}, content_type='application/json')
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        lines = response.content.decode().splitlines()
+        self.assertIn('library_request_duration_seconds_bucket{endpoint="books.borrow",le="+Inf"} 2', lines)
+        self.assertIn('library_request_duration_seconds_count{endpoint="books.borrow"} 2', lines)
+        self.assertIn('library_request_errors_total{endpoint="books.borrow",status="400"} 1', lines)
+        self.assertIn('library_borrows_total 1', lines)
+        self.assertIn('library_fines_outstanding 12.0', lines)
+        self.assertFalse(any('endpoint="metrics"' in line for line in lines))
+
+
+class BootstrapTests(TestCase):
+    def setUp(self):
+        self.category = create_category()
+        self.books = [create_book(index, self.category) for index in range(3)]
+        self.user = create_user(1)
+
+    def test_invalid_since_is_rejected(self):
+        for since in ['abc', '999999999999999999999', '-999999999999999999999']:
+            self.assertEqual(self.client.get(f'/api/bootstrap/?since={since}').status_code, 400)
+
+    def test_revalidation_is_one_count_free_query(self):
+        response = self.client.get('/api/bootstrap/')
+        self.assertEqual(len(response.json()['books']), 3)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/bootstrap/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(context), 1)
+        self.assertNotIn('COUNT', context.captured_queries[0]['sql'])
+
+    def test_delta_overlaps_the_watermark(self):
+        version = self.client.get('/api/bootstrap/').json()['version']
+        # A row stamped just before the version but committed after the client's fetch
+        Book.objects.filter(pk=self.books[0].pk).update(
+            title='Late Commit', updated_at=version_to_datetime(version) - timedelta(seconds=1)
+        )
+
+        delta = self.client.get(f'/api/bootstrap/?since={version}').json()
+        self.assertEqual(delta['since'], version)
+        self.assertIn('Late Commit', [book['title'] for book in delta['books']])
+
+    def test_delta_reports_deletions_and_changes_etag(self):
+        full = self.client.get('/api/bootstrap/')
+        version = full.json()['version']
+        deleted_id = self.books[1].id
+        self.books[1].delete()
+
+        response = self.client.get('/api/bootstrap/', HTTP_IF_NONE_MATCH=full['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+        delta = self.client.get(f'/api/bootstrap/?since={version}').json()
+        self.assertEqual(delta['deleted']['books'], [str(deleted_id)])
+        self.assertGreaterEqual(delta['version'], version)
+
+    def test_late_commit_is_fetched_once_the_overlap_passes(self):
+        full = self.client.get('/api/bootstrap/')
+        newest = Book.objects.order_by('-updated_at').values_list('updated_at', flat=True)[0]
+        # Stamped before the newest change but committed after the client's fetch
+        Book.objects.filter(pk=self.books[0].pk).update(
+            title='Late Commit', updated_at=newest - timedelta(seconds=1)
+        )
+
+        later = timezone.now() + DELTA_OVERLAP + timedelta(seconds=1)
+        with mock.patch('library_api.snapshot.timezone.now', return_value=later):
+            response = self.client.get('/api/bootstrap/', HTTP_IF_NONE_MATCH=full['ETag'])
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Late Commit', [book['title'] for book in response.json()['books']])
+
+            response = self.client.get('/api/bootstrap/', HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+
+    def test_cascade_delete_prunes_tombstones_once(self):
+        for index in range(3, 20):
+            create_book(index, self.category)
+
+        with CaptureQueriesContext(connection) as context:
+            self.category.delete()
+
+        prunes = [
+            query for query in context.captured_queries
+            if query['sql'].startswith('DELETE FROM "library_api_deletedrecord"')
+        ]
+        self.assertLessEqual(len(prunes), 1)
+        self.assertEqual(DeletedRecord.objects.filter(collection='books').count(), 20)
+
+    def test_dashboard_adds_stats_to_full_snapshots(self):
+        LibraryUser.objects.filter(pk=self.user.pk).update(fines=5)
+        self.client.post(
+            f'/api/books/{self.books[0].id}/borrow/', {'user_id': str(self.user.id)},
+            content_type='application/json'
+        )
+
+        dashboard = self.client.get('/api/dashboard/').json()
+        self.assertEqual(len(dashboard['books']), 3)
+        self.assertEqual(dashboard['stats'], {
+            'total_books': 9,
+            'available_books': 8,
+            'borrowed_books': 1,
+            'overdue_books': 0,
+            'total_users': 1,
+            'active_users': 1,
+            'total_fines': 5.0,
+        })
+
+        delta = self.client.get(f'/api/dashboard/?since={dashboard["version"]}').json()
+        self.assertNotIn('stats', delta)
@@ -1,12 +1,17 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import BookViewSet, CategoryViewSet, LibraryUserViewSet, TransactionViewSet
+from .views import (
+    BookViewSet, BootstrapViewSet, CategoryViewSet, DashboardViewSet, LibraryUserViewSet,
+    TransactionViewSet
+)
 
 router = DefaultRouter()
 router.register(r'books', BookViewSet)
 router.register(r'categories', CategoryViewSet)
 router.register(r'users', LibraryUserViewSet)
 router.register(r'transactions', TransactionViewSet)
+router.register(r'bootstrap', BootstrapViewSet, basename='bootstrap')
+router.register(r'dashboard', DashboardViewSet, basename='dashboard')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,8 +1,15 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
-from .models import Book, Category, LibraryUser, Transaction
+from django.db import transaction as db_transaction
+from django.db.models import Case, CharField, Count, F, IntegerField, Q, Value, When
+from django.db.models.functions import Cast, Floor, Greatest
+from django.utils import timezone
+from django.utils.http import parse_etags
+from .models import Book, BookTag, Category, LibraryUser, Tag, Transaction
+from .metrics import registry as metrics
+from .snapshot import build_snapshot, dashboard_stats, snapshot_etag, version_to_datetime
+from .suggest import MAX_SUGGESTIONS, book_index
 from .serializers import (
     BookSerializer, CategorySerializer, LibraryUserSerializer, 
     TransactionSerializer, BookListSerializer, UserListSerializer
@@ -61,12 +68,22 @@ class BookViewSet(viewsets.ModelViewSet):
         # Search functionality
         search = self.request.query_params.get('search', None)
         if search:
+            tagged = BookTag.objects.filter(tag__name__startswith=Tag.normalize(search))
             queryset = queryset.filter(
                 Q(title__icontains=search) | 
                 Q(author__icontains=search) |
-                Q(tags__icontains=search)
+                Q(id__in=tagged.values('book_id'))
             )
         
+        # Tag filter (?tag=a&tag=b, all tags must match unless tag_mode=or)
+        tags = {Tag.normalize(tag) for tag in self.request.query_params.getlist('tag')}
+        tags.discard('')
+        if tags:
+            tagged = BookTag.objects.filter(tag__name__in=tags).values('book_id')
+            if self.request.query_params.get('tag_mode') != 'or':
+                tagged = tagged.annotate(matched=Count('tag_id')).filter(matched=len(tags))
+            queryset = queryset.filter(id__in=tagged.values('book_id'))
+        
         # Category filter
         category = self.request.query_params.get('category', None)
         if category:
@@ -106,30 +123,98 @@ class BookViewSet(viewsets.ModelViewSet):
         if book.available <= 0:
             return Response({'error': 'Book not available'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Create transaction
         from datetime import date, timedelta
         borrow_date = date.today()
         due_date = borrow_date + timedelta(days=15)
         
-        transaction = Transaction.objects.create(
-            user=user,
-            book=book,
-            type='borrow',
-            borrow_date=borrow_date,
-            due_date=due_date,
-            status='borrowed'
-        )
-        
-        # Update book availability
-        book.available -= 1
-        book.save()
+        with db_transaction.atomic():
+            # Reserve a loan slot; the conditional update enforces the limit atomically
+            reserved = LibraryUser.objects.filter(
+                id=user.id, active_loans__lt=user.loan_limit
+            ).update(
+                active_loans=F('active_loans') + 1,
+                last_activity=timezone.now(),
+                updated_at=timezone.now()
+            )
+            if not reserved:
+                return Response(
+                    {'error': f'Borrowing limit of {user.loan_limit} books reached'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Create transaction
+            transaction = Transaction.objects.create(
+                user=user,
+                book=book,
+                type='borrow',
+                borrow_date=borrow_date,
+                due_date=due_date,
+                status='borrowed'
+            )
+            
+            # Update book availability
+            book.available -= 1
+            book.save(update_fields=['available', 'updated_at'])
         
+        metrics.inc('library_borrows_total')
         return Response({
             'message': 'Book borrowed successfully',
             'transaction_id': transaction.id,
             'due_date': due_date
         })
 
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """Typeahead suggestions ranked by popularity"""
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), MAX_SUGGESTIONS)
+        except ValueError:
+            return Response({'error': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(book_index.suggest(query, limit))
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Get facet counts for the current filter in a single query"""
+        books = self.get_queryset().order_by()
+
+        def facet(name, queryset, key):
+            return (
+                queryset.order_by()
+                .annotate(facet=Value(name, output_field=CharField()), key=key)
+                .values('facet', 'key')
+                .annotate(count=Count('pk'))
+            )
+
+        # Floor keeps this an integer decade on backends where / is decimal division (MySQL)
+        decade = Cast(
+            Cast(Floor(F('year') / 10) * 10, output_field=IntegerField()),
+            output_field=CharField()
+        )
+        availability = Case(
+            When(available__gt=0, then=Value('available')),
+            default=Value('unavailable'),
+            output_field=CharField()
+        )
+        tags = BookTag.objects.filter(book__in=books.values('id'))
+
+        rows = facet('category', books, F('category__name')).union(
+            facet('sub_category', books, F('sub_category')),
+            facet('tag', tags, F('tag__name')),
+            facet('decade', books, decade),
+            facet('availability', books, availability),
+            all=True
+        )
+
+        facets = {name: [] for name in ['category', 'sub_category', 'tag', 'decade', 'availability']}
+        for row in rows:
+            value = int(row['key']) if row['facet'] == 'decade' else row['key']
+            facets[row['facet']].append({'value': value, 'count': row['count']})
+        for values in facets.values():
+            values.sort(key=lambda item: (-item['count'], str(item['value'])))
+        return Response(facets)
+
     @action(detail=False, methods=['get'])
     def popular(self, request):
         """Get popular books"""
@@ -169,6 +254,21 @@ class LibraryUserViewSet(viewsets.ModelViewSet):
         if active_only == 'true':
             queryset = queryset.filter(is_active=True)
         
+        # Loan filters
+        if self.request.query_params.get('has_loans') == 'true':
+            queryset = queryset.filter(active_loans__gt=0)
+        if self.request.query_params.get('has_overdue') == 'true':
+            queryset = queryset.filter(overdue_loans__gt=0)
+        
+        # Sorting
+        sort_by = self.request.query_params.get('sort_by', 'name')
+        if sort_by in ['active_loans', 'overdue_loans']:
+            queryset = queryset.order_by(f'-{sort_by}', 'name', 'id')
+        elif sort_by == 'last_activity':
+            queryset = queryset.order_by(F('last_activity').desc(nulls_last=True), 'name', 'id')
+        elif sort_by == 'fines':
+            queryset = queryset.order_by('-fines', 'name', 'id')
+        
         return queryset
 
     @action(detail=True, methods=['get'])
@@ -231,40 +331,82 @@ class TransactionViewSet(viewsets.ModelViewSet):
         
         return queryset
 
+    def perform_create(self, serializer):
+        with db_transaction.atomic():
+            transaction = serializer.save()
+            LibraryUser.refresh_loan_counts(LibraryUser.objects.filter(id=transaction.user_id))
+
+    def perform_update(self, serializer):
+        # The loan may have changed status or moved to another user; recount both
+        user_ids = {serializer.instance.user_id}
+        with db_transaction.atomic():
+            transaction = serializer.save()
+            user_ids.add(transaction.user_id)
+            LibraryUser.refresh_loan_counts(LibraryUser.objects.filter(id__in=user_ids))
+
+    def perform_destroy(self, instance):
+        with db_transaction.atomic():
+            instance.delete()
+            LibraryUser.refresh_loan_counts(LibraryUser.objects.filter(id=instance.user_id))
+
     @action(detail=True, methods=['post'])
     def return_book(self, request, pk=None):
         """Return a borrowed book"""
         transaction = self.get_object()
         
-        if transaction.status == 'returned':
-            return Response({'error': 'Book already returned'}, status=status.HTTP_400_BAD_REQUEST)
-        
         from datetime import date
         return_date = date.today()
         
-        # Calculate fine if overdue
-        fine = 0
-        if return_date > transaction.due_date:
-            overdue_days = (return_date - transaction.due_date).days
-            fine = overdue_days * 1  # ₹1 per day
-        
-        # Update transaction
-        transaction.return_date = return_date
-        transaction.status = 'returned'
-        transaction.fine_amount = fine
-        transaction.save()
-        
-        # Update book availability
-        book = transaction.book
-        book.available += 1
-        book.save()
-        
-        # Add fine to user if applicable
+        with db_transaction.atomic():
+            # Re-read the loan under a row lock so concurrent returns see one outcome
+            transaction = (
+                Transaction.objects.select_for_update()
+                .select_related('book')
+                .get(pk=transaction.pk)
+            )
+            if transaction.status == 'returned':
+                return Response({'error': 'Book already returned'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Calculate fine if overdue
+            fine = 0
+            if return_date > transaction.due_date:
+                overdue_days = (return_date - transaction.due_date).days
+                fine = overdue_days * 1  # ₹1 per day
+            
+            was_overdue = transaction.status == 'overdue'
+            
+            # Update transaction; the status guard makes the return happen at most once
+            returned = Transaction.objects.filter(
+                pk=transaction.pk, status=transaction.status
+            ).update(
+                return_date=return_date,
+                status='returned',
+                fine_amount=fine,
+                updated_at=timezone.now()
+            )
+            if not returned:
+                return Response({'error': 'Book already returned'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Update book availability
+            book = transaction.book
+            book.available += 1
+            book.save(update_fields=['available', 'updated_at'])
+            
+            # Release the loan slot and add fine to user if applicable
+            user_updates = {
+                'active_loans': Greatest(F('active_loans') - 1, 0),
+                'last_activity': timezone.now(),
+                'updated_at': timezone.now(),
+            }
+            if was_overdue:
+                user_updates['overdue_loans'] = Greatest(F('overdue_loans') - 1, 0)
+            if fine > 0:
+                user_updates['fines'] = F('fines') + fine
+            LibraryUser.objects.filter(id=transaction.user_id).update(**user_updates)
+        
+        metrics.inc('library_returns_total')
         if fine > 0:
-            user = transaction.user
-            user.fines += fine
-            user.save()
-        
+            metrics.inc('library_fines_assessed_total', fine)
         return Response({
             'message': 'Book returned successfully',
             'fine_amount': fine,
@@ -275,14 +417,19 @@ class TransactionViewSet(viewsets.ModelViewSet):
     def overdue(self, request):
         """Get overdue transactions"""
         from datetime import date
-        overdue_transactions = self.get_queryset().filter(
+        newly_overdue = Transaction.objects.filter(
             due_date__lt=date.today(),
             status='borrowed'
         )
         
-        # Update status to overdue
-        overdue_transactions.update(status='overdue')
+        # Update status to overdue and refresh the affected users' loan counts
+        with db_transaction.atomic():
+            user_ids = list(newly_overdue.values_list('user_id', flat=True).distinct())
+            if user_ids:
+                newly_overdue.update(status='overdue', updated_at=timezone.now())
+                LibraryUser.refresh_loan_counts(LibraryUser.objects.filter(id__in=user_ids))
         
+        overdue_transactions = self.get_queryset().filter(status='overdue')
         serializer = self.get_serializer(overdue_transactions, many=True)
         return Response(serializer.data)
 
@@ -323,4 +470,40 @@ class TransactionViewSet(viewsets.ModelViewSet):
             'total_fines': total_fines,
             'popular_books': popular_books,
             'recent_activity': list(recent_activity)
-        })
\ No newline at end of file
+        })
+
+
+class BootstrapViewSet(viewsets.ViewSet):
+    """Books, users, categories and transactions in a single versioned snapshot"""
+
+    def list(self, request):
+        since = request.query_params.get('since', None)
+        if since is not None:
+            try:
+                since = int(since)
+                version_to_datetime(since)
+            except (ValueError, OverflowError):
+                return Response({'error': 'Invalid since version'}, status=status.HTTP_400_BAD_REQUEST)
+
+        etag = snapshot_etag(since)
+        client_etags = [
+            tag[2:] if tag.startswith('W/') else tag
+            for tag in parse_etags(request.headers.get('If-None-Match', ''))
+        ]
+        if etag in client_etags or '*' in client_etags:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        snapshot = build_snapshot(since)
+        return Response(self.get_payload(snapshot), headers={'ETag': etag})
+
+    def get_payload(self, snapshot):
+        return snapshot
+
+
+class DashboardViewSet(BootstrapViewSet):
+    """Bootstrap snapshot plus headline statistics"""
+
+    def get_payload(self, snapshot):
+        if snapshot['since'] is None:
+            snapshot['stats'] = dashboard_stats(snapshot)
+        return snapshot
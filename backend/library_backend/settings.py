@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -26,6 +27,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'library_api.metrics.MetricsMiddleware',
+    'django.middleware.gzip.GZipMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -104,6 +107,17 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20
 }
 
+# Maximum concurrent loans per LibraryUser role
+LIBRARY_LOAN_LIMITS = {
+    'student': 5,
+    'admin': 10,
+}
+
+# Per-process metrics snapshots, merged by /metrics
+LIBRARY_METRICS_DIR = os.environ.get(
+    'LIBRARY_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'library_metrics')
+)
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
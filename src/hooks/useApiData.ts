@@ -1,7 +1,17 @@
-import { useState, useEffect, useCallback } from 'react';
-import { apiService } from '../services/api';
+import { useState, useEffect, useCallback, useRef } from 'react';
+import { apiService, BootstrapSnapshot } from '../services/api';
 import { Book, User, Category, Transaction } from '../types';
 
+const mergeById = (current: any[], changed: any[], deleted: string[]) => {
+  const updates = new Map(changed.map(item => [item.id, item]));
+  const removed = new Set(deleted);
+  const merged = current
+    .filter(item => !removed.has(item.id))
+    .map(item => updates.get(item.id) ?? item);
+  const existing = new Set(current.map(item => item.id));
+  return [...merged, ...changed.filter(item => !existing.has(item.id) && !removed.has(item.id))];
+};
+
 export const useApiData = () => {
   const [books, setBooks] = useState<Book[]>([]);
   const [users, setUsers] = useState<User[]>([]);
@@ -9,23 +19,31 @@ export const useApiData = () => {
   const [transactions, setTransactions] = useState<Transaction[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  const snapshotRef = useRef<BootstrapSnapshot | null>(null);
 
   const loadData = useCallback(async () => {
     try {
       setLoading(true);
       setError(null);
       
-      const [booksData, usersData, categoriesData, transactionsData] = await Promise.all([
-        apiService.getBooks(),
-        apiService.getUsers(),
-        apiService.getCategories(),
-        apiService.getTransactions()
-      ]);
-
-      setBooks(booksData);
-      setUsers(usersData);
-      setCategories(categoriesData);
-      setTransactions(transactionsData);
+      // One consolidated snapshot; after the first load only rows changed since our version
+      const previous = snapshotRef.current;
+      let snapshot = await apiService.getBootstrap(previous?.version);
+      if (previous && snapshot.since !== null) {
+        snapshot = {
+          ...snapshot,
+          books: mergeById(previous.books, snapshot.books, snapshot.deleted.books),
+          users: mergeById(previous.users, snapshot.users, snapshot.deleted.users),
+          categories: mergeById(previous.categories, snapshot.categories, snapshot.deleted.categories),
+          transactions: mergeById(previous.transactions, snapshot.transactions, snapshot.deleted.transactions),
+        };
+      }
+      snapshotRef.current = snapshot;
+
+      setBooks(snapshot.books);
+      setUsers(snapshot.users);
+      setCategories(snapshot.categories);
+      setTransactions(snapshot.transactions);
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Failed to load data');
       console.error('Error loading data:', err);
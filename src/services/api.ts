@@ -7,6 +7,16 @@ export interface ApiResponse<T> {
   message?: string;
 }
 
+export interface BootstrapSnapshot {
+  version: number;
+  since: number | null;
+  deleted: Record<'books' | 'users' | 'categories' | 'transactions', string[]>;
+  books: any[];
+  users: any[];
+  categories: any[];
+  transactions: any[];
+}
+
 class ApiService {
   private async request<T>(endpoint: string, options: RequestInit = {}): Promise<T> {
     const url = `${API_BASE_URL}${endpoint}`;
@@ -33,21 +43,45 @@ class ApiService {
     }
   }
 
+  // Bootstrap API
+  async getBootstrap(since?: number): Promise<BootstrapSnapshot> {
+    const query = since !== undefined ? `?since=${since}` : '';
+    return this.request(`/bootstrap/${query}`);
+  }
+
   // Books API
   async getBooks(params?: {
     search?: string;
     category?: string;
     available_only?: boolean;
     sort_by?: string;
+    tags?: string[];
+    tag_mode?: 'and' | 'or';
   }): Promise<any[]> {
+    const query = this.bookFilterQuery(params);
+    return this.request(`/books/${query ? `?${query}` : ''}`);
+  }
+
+  async getBookFacets(params?: Parameters<ApiService['getBooks']>[0]): Promise<Record<string, { value: string | number; count: number }[]>> {
+    const query = this.bookFilterQuery(params);
+    return this.request(`/books/facets/${query ? `?${query}` : ''}`);
+  }
+
+  private bookFilterQuery(params?: Parameters<ApiService['getBooks']>[0]): string {
     const searchParams = new URLSearchParams();
     if (params?.search) searchParams.append('search', params.search);
     if (params?.category) searchParams.append('category', params.category);
     if (params?.available_only) searchParams.append('available_only', 'true');
     if (params?.sort_by) searchParams.append('sort_by', params.sort_by);
-    
-    const query = searchParams.toString();
-    return this.request(`/books/${query ? `?${query}` : ''}`);
+    params?.tags?.forEach(tag => searchParams.append('tag', tag));
+    if (params?.tag_mode) searchParams.append('tag_mode', params.tag_mode);
+    return searchParams.toString();
+  }
+
+  async suggestBooks(q: string, limit?: number): Promise<{ id: string; title: string }[]> {
+    const searchParams = new URLSearchParams({ q });
+    if (limit) searchParams.append('limit', String(limit));
+    return this.request(`/books/suggest/?${searchParams.toString()}`);
   }
 
   async getBook(id: string): Promise<any> {